@@ -1,14 +1,41 @@
+import asyncio
 import datetime
 import logging.config
 from environs import Env
 from seller import download_stock
 
+import httpx
+import orjson
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from seller import divide, price_conversion
+from seller import _get_json, _post_json, divide
 
 logger = logging.getLogger(__file__)
 
+# Особые значения колонки "Количество": ">10" — запас 100, "1" — запас 0
+_COUNT_OVERRIDES = {">10": 100, "1": 0}
+
+# Общая сессия с пулом keep-alive соединений к api.partner.market.yandex.ru,
+# чтобы не открывать новое TLS-соединение на каждый запрос
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST", "PUT"],
+            respect_retry_after_header=True,
+        ),
+    ),
+)
+
 
 def get_product_list(page, campaign_id, access_token):
     """ Получает список товаров на Яндекс.Маркете
@@ -27,16 +54,15 @@ def get_product_list(page, campaign_id, access_token):
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
     }
     payload = {
         "page_token": page,
         "limit": 200,
     }
     url = endpoint_url + f"campaigns/{campaign_id}/offer-mapping-entries"
-    response = requests.get(url, headers=headers, params=payload)
+    response = _SESSION.get(url, headers=headers, params=payload, timeout=(5, 30))
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object.get("result")
 
 
@@ -56,16 +82,40 @@ def update_stocks(stocks, campaign_id, access_token):
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
     }
     payload = {"skus": stocks}
     url = endpoint_url + f"campaigns/{campaign_id}/offers/stocks"
-    response = requests.put(url, headers=headers, json=payload)
+    response = _SESSION.put(
+        url, headers=headers, data=orjson.dumps(payload), timeout=(5, 30)
+    )
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object
 
 
+async def update_stocks_async(client, stocks, campaign_id, access_token):
+    """ Обновление запасов товаров на Яндекс.Маркете через httpx-клиент.
+    Асинхронный вариант update_stocks для конкурентной отправки партий запасов.
+    Args:
+        client (httpx.AsyncClient): Клиент для отправки запроса.
+        stocks (list): Список товаров, для которых необходимо обновить запасы.
+        campaign_id (str): Идентификатор кампании, в которой обновляются запасы.
+        access_token (str): Токен доступа для авторизации.
+
+    Returns:
+        dict: Ответ от API Яндекс.Маркета, содержащий информацию об обновленных запасах
+    """
+
+    endpoint_url = "https://api.partner.market.yandex.ru/"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+    }
+    url = endpoint_url + f"campaigns/{campaign_id}/offers/stocks"
+    return await _post_json(client, url, {"skus": stocks}, headers, method="PUT")
+
+
 def update_price(prices, campaign_id, access_token):
     """ Обновление цены товаров на Яндекс.Маркете.
     Отправляются обновления цен для указанных товаров. Передаются в виде списка предложений
@@ -83,16 +133,40 @@ def update_price(prices, campaign_id, access_token):
         "Content-Type": "application/json",
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
     }
     payload = {"offers": prices}
     url = endpoint_url + f"campaigns/{campaign_id}/offer-prices/updates"
-    response = requests.post(url, headers=headers, json=payload)
+    response = _SESSION.post(
+        url, headers=headers, data=orjson.dumps(payload), timeout=(5, 30)
+    )
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object
 
 
+async def update_price_async(client, prices, campaign_id, access_token):
+    """ Обновление цены товаров на Яндекс.Маркете через httpx-клиент.
+    Асинхронный вариант update_price для конкурентной отправки партий цен.
+    Args:
+        client (httpx.AsyncClient): Клиент для отправки запроса.
+        prices (list): Список объектов, содержащих информацию о ценах товаров.
+        campaign_id (str): Идентификатор кампании, в которой обновляются цены.
+        access_token (str): Токен доступа для авторизации.
+
+    Returns:
+        dict: Ответ от API Яндекс.Маркета, содержащий информацию об обновленных ценах.
+    """
+
+    endpoint_url = "https://api.partner.market.yandex.ru/"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+    }
+    url = endpoint_url + f"campaigns/{campaign_id}/offer-prices/updates"
+    return await _post_json(client, url, {"offers": prices}, headers)
+
+
 def get_offer_ids(campaign_id, market_token):
     """ Получить артикулы товаров Яндекс маркета
     Извлекает список артикулов всех товаров и собирает все артикулы в один список.
@@ -116,6 +190,80 @@ def get_offer_ids(campaign_id, market_token):
     return offer_ids
 
 
+async def get_product_list_async(client, page, campaign_id, access_token):
+    """ Получает список товаров на Яндекс.Маркете через httpx-клиент.
+    Асинхронный вариант get_product_list.
+
+    Args:
+        client (httpx.AsyncClient): Клиент для отправки запроса.
+        page (str): Используется для конкретных страниц результатов.
+        campaign_id (str): Идентификатор кампании, из которой нужно получить товары.
+        access_token (str): Токен доступа.
+
+    Returns:
+        list: Список записей товарных предложений, полученнных от Яндекс.Маркета
+    """
+
+    endpoint_url = "https://api.partner.market.yandex.ru/"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+    }
+    payload = {
+        "page_token": page,
+        "limit": 200,
+    }
+    url = endpoint_url + f"campaigns/{campaign_id}/offer-mapping-entries"
+    response_object = await _get_json(client, url, payload, headers)
+    return response_object.get("result")
+
+
+async def get_offer_ids_async(campaign_id, market_token):
+    """ Получить артикулы товаров Яндекс маркета с предвыборкой страниц.
+    Пока обрабатывается текущая страница, отдельная задача уже запрашивает
+    следующую по nextPageToken, так что разбор перекрывается с сетевым ожиданием.
+
+    Args:
+        campaign_id (str): Идентификатор кампании, для которой необходимо получить товары.
+        market_token (str): Токен доступа для авторизации.
+    Returns:
+        list: Список артикулов  товаров.
+    """
+
+    queue = asyncio.Queue(maxsize=2)
+
+    async def produce(client):
+        # Сентинел кладем в finally: иначе при ошибке продюсера
+        # потребитель навсегда зависнет на queue.get()
+        try:
+            page = ""
+            while True:
+                some_prod = await get_product_list_async(
+                    client, page, campaign_id, market_token
+                )
+                await queue.put(some_prod)
+                page = some_prod.get("paging").get("nextPageToken")
+                if not page:
+                    break
+        finally:
+            await queue.put(None)
+
+    product_list = []
+    async with httpx.AsyncClient(http2=True, timeout=30) as client:
+        producer = asyncio.create_task(produce(client))
+        while True:
+            some_prod = await queue.get()
+            if some_prod is None:
+                break
+            product_list.extend(some_prod.get("offerMappingEntries"))
+        await producer
+    offer_ids = []
+    for product in product_list:
+        offer_ids.append(product.get("offer").get("shopSku"))
+    return offer_ids
+
+
 def create_stocks(watch_remnants, offer_ids, warehouse_id):
     """ Создает список остатков товаров для определнного склада.
     Обрабатываются остатки товаров, проверяется наличие артикулов в списке приедложений и формируется структура данных.
@@ -127,45 +275,29 @@ def create_stocks(watch_remnants, offer_ids, warehouse_id):
     Returns:
         list: Список словарей, каждый из которых представляет собой остаток товара с ключами "sku", "warehouseId" и "items".
     """
-    # Уберем то, что не загружено в market
-    stocks = list()
     date = str(datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z")
+    # Общая часть items одна на все строки — не собираем её заново в цикле
+    item_template = {"type": "FIT", "updatedAt": date}
+    # Дубликаты кодов в выгрузке схлопываем заранее: последняя строка побеждает
+    watch_by_code = {}
     for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append(
-                {
-                    "sku": str(watch.get("Код")),
-                    "warehouseId": warehouse_id,
-                    "items": [
-                        {
-                            "count": stock,
-                            "type": "FIT",
-                            "updatedAt": date,
-                        }
-                    ],
-                }
-            )
-            offer_ids.remove(str(watch.get("Код")))
-    # Добавим недостающее из загруженного:
+        watch_by_code[str(watch["Код"])] = watch
+    # Один проход по артикулам: либо остаток из выгрузки, либо ноль
+    stocks = list()
     for offer_id in offer_ids:
+        watch = watch_by_code.get(offer_id)
+        if watch is None:
+            stock = 0
+        else:
+            count = str(watch["Количество"])
+            stock = _COUNT_OVERRIDES.get(count)
+            if stock is None:
+                stock = int(count)
         stocks.append(
             {
                 "sku": offer_id,
                 "warehouseId": warehouse_id,
-                "items": [
-                    {
-                        "count": 0,
-                        "type": "FIT",
-                        "updatedAt": date,
-                    }
-                ],
+                "items": [{"count": stock, **item_template}],
             }
         )
     return stocks
@@ -177,33 +309,46 @@ def create_prices(watch_remnants, offer_ids):
 
     Args:
         watch_remnants (list): Список словарей с информацией о остатках товаров. Каждый словарь должен содержать ключи "Код" и "Цена".
-        offer_ids (list): Список идентификаторов предложений, для которых необходимо получить цены.
+        offer_ids (frozenset): Набор идентификаторов предложений, для которых необходимо получить цены.
 
     Returns:
         list: Список словарей, каждый из которых представляет собой цену товара с ключами "id" и "price".
     
     """
     
-    prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "id": str(watch.get("Код")),
-                # "feed": {"id": 0},
-                "price": {
-                    "value": int(price_conversion(watch.get("Цена"))),
-                    # "discountBase": 0,
-                    "currencyId": "RUR",
-                    # "vat": 0,
-                },
-                # "marketSku": 0,
-                # "shopSku": "string",
-            }
-            prices.append(price)
+    watch_frame = pd.DataFrame(watch_remnants, columns=["Код", "Цена"])
+    watch_frame["Код"] = watch_frame["Код"].astype(str)
+    # Дубликаты кодов в выгрузке схлопываем заранее: последняя строка побеждает
+    watch_frame = watch_frame.drop_duplicates(subset="Код", keep="last")
+    watch_frame = watch_frame[watch_frame["Код"].isin(offer_ids)]
+    # Векторная чистка цены вместо price_conversion() на каждой строке
+    price_values = (
+        watch_frame["Цена"]
+        .astype(str)
+        .str.split(".")
+        .str[0]
+        .str.replace(r"[^0-9]", "", regex=True)
+        .astype(int)
+    )
+    prices = [
+        {
+            "id": offer_id,
+            # "feed": {"id": 0},
+            "price": {
+                "value": value,
+                # "discountBase": 0,
+                "currencyId": "RUR",
+                # "vat": 0,
+            },
+            # "marketSku": 0,
+            # "shopSku": "string",
+        }
+        for offer_id, value in zip(watch_frame["Код"], price_values.tolist())
+    ]
     return prices
 
 
-async def upload_prices(watch_remnants, campaign_id, market_token):
+async def upload_prices(watch_remnants, campaign_id, market_token, offer_ids=None):
     """ Обновляет цены на товары.
     Создается список цен на основе остатка товаров и обновляет цены по 500.
     
@@ -211,19 +356,35 @@ async def upload_prices(watch_remnants, campaign_id, market_token):
         watch_remnants (list): Список остатков товаров.
         campaign_id (str): Идентификатор кампании, для которой обновляются цены.
         market_token (str): Токен доступа к маркетплейсу для аутентификации запросов.
+        offer_ids (list): Уже полученный список артикулов. Если не передан,
+            список запрашивается у API заново.
 
     Returns:
         list: Список обновленных цен для товаров.
 
     """
-    offer_ids = get_offer_ids(campaign_id, market_token)
-    prices = create_prices(watch_remnants, offer_ids)
-    for some_prices in list(divide(prices, 500)):
-        update_price(some_prices, campaign_id, market_token)
+    if offer_ids is None:
+        offer_ids = await get_offer_ids_async(campaign_id, market_token)
+    # Неизменяемый набор для быстрых проверок принадлежности
+    offer_set = frozenset(offer_ids)
+    prices = create_prices(watch_remnants, offer_set)
+    limits = httpx.Limits(max_connections=16)
+    async with httpx.AsyncClient(http2=True, timeout=30, limits=limits) as client:
+        semaphore = asyncio.Semaphore(8)
+
+        async def send(some_prices):
+            async with semaphore:
+                return await update_price_async(
+                    client, some_prices, campaign_id, market_token
+                )
+
+        await asyncio.gather(*(send(some_prices) for some_prices in divide(prices, 500)))
     return prices
 
 
-async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id):
+async def upload_stocks(
+    watch_remnants, campaign_id, market_token, warehouse_id, offer_ids=None
+):
     """ Обновляет запасы товаров.
     Создает список запасов на основе остатков товаров и обновляет запасы по 2000. В результате получаются два списка.
     
@@ -232,18 +393,28 @@ async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id)
         campaign_id (str): Идентификатор кампании, для которой обновляются запасы.
         market_token (str): Токен доступа к маркетплейсу для аутентификации запросов.
         warehouse_id (str): Идентификатор склада, на котором находятся товары.
+        offer_ids (list): Уже полученный список артикулов. Если не передан,
+            список запрашивается у API заново.
 
     Returns:
             list: Список непустых запасов товаров.
             list: Полный список запасов товаров.
     """
-    offer_ids = get_offer_ids(campaign_id, market_token)
+    if offer_ids is None:
+        offer_ids = await get_offer_ids_async(campaign_id, market_token)
     stocks = create_stocks(watch_remnants, offer_ids, warehouse_id)
-    for some_stock in list(divide(stocks, 2000)):
-        update_stocks(some_stock, campaign_id, market_token)
-    not_empty = list(
-        filter(lambda stock: (stock.get("items")[0].get("count") != 0), stocks)
-    )
+    limits = httpx.Limits(max_connections=16)
+    async with httpx.AsyncClient(http2=True, timeout=30, limits=limits) as client:
+        semaphore = asyncio.Semaphore(8)
+
+        async def send(some_stock):
+            async with semaphore:
+                return await update_stocks_async(
+                    client, some_stock, campaign_id, market_token
+                )
+
+        await asyncio.gather(*(send(some_stock) for some_stock in divide(stocks, 2000)))
+    not_empty = [stock for stock in stocks if stock["items"][0]["count"]]
     return not_empty, stocks
 
 
@@ -256,24 +427,32 @@ def main():
     warehouse_dbs_id = env.str("WAREHOUSE_DBS_ID")
 
     watch_remnants = download_stock()
+
+    async def run_campaign(campaign_id, warehouse_id):
+        # Получаем артикулы один раз и используем для остатков и цен
+        offer_ids = await get_offer_ids_async(campaign_id, market_token)
+        # Обновить остатки
+        await upload_stocks(
+            watch_remnants,
+            campaign_id,
+            market_token,
+            warehouse_id,
+            offer_ids=offer_ids,
+        )
+        # Поменять цены
+        await upload_prices(
+            watch_remnants, campaign_id, market_token, offer_ids=offer_ids
+        )
+
+    async def run_campaigns():
+        # FBS и DBS независимы — гоняем их параллельно на одном событийном цикле
+        await asyncio.gather(
+            run_campaign(campaign_fbs_id, warehouse_fbs_id),
+            run_campaign(campaign_dbs_id, warehouse_dbs_id),
+        )
+
     try:
-        # FBS
-        offer_ids = get_offer_ids(campaign_fbs_id, market_token)
-        # Обновить остатки FBS
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_fbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_fbs_id, market_token)
-        # Поменять цены FBS
-        upload_prices(watch_remnants, campaign_fbs_id, market_token)
-
-        # DBS
-        offer_ids = get_offer_ids(campaign_dbs_id, market_token)
-        # Обновить остатки DBS
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_dbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_dbs_id, market_token)
-        # Поменять цены DBS
-        upload_prices(watch_remnants, campaign_dbs_id, market_token)
+        asyncio.run(run_campaigns())
     except requests.exceptions.ReadTimeout:
         print("Превышено время ожидания...")
     except requests.exceptions.ConnectionError as error:
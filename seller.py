@@ -1,15 +1,108 @@
-import io
+import asyncio
 import logging.config
-import os
 import re
+import shutil
+import tempfile
 import zipfile
 from environs import Env
 
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__file__)
 
+# Скомпилированный шаблон для очистки цены от всего, кроме цифр
+_PRICE_RE = re.compile(r"[^0-9]")
+
+# Особые значения колонки "Количество": ">10" — запас 100, "1" — запас 0
+_COUNT_OVERRIDES = {">10": 100, "1": 0}
+
+# Общая сессия с пулом keep-alive соединений к api-seller.ozon.ru,
+# чтобы не открывать новое TLS-соединение на каждый запрос
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "POST", "PUT"],
+            respect_retry_after_header=True,
+        ),
+    ),
+)
+
+# Токен-бакет: не больше 10 запросов в секунду к api-seller.ozon.ru,
+# чтобы конкурентные партии не упирались в 429
+_LIMITER = AsyncLimiter(max_rate=10, time_period=1.0)
+
+
+@retry(
+    retry=retry_if_exception_type((httpx.HTTPStatusError, httpx.TransportError)),
+    wait=wait_exponential(multiplier=0.5),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+async def _post_json(client, url, payload, headers, method="POST"):
+    """Отправить JSON-запрос через httpx и вернуть разобранный ответ.
+
+    Args:
+        client (httpx.AsyncClient): Клиент, через который отправляется запрос.
+        url (str): Адрес запроса.
+        payload (dict): Тело запроса.
+        headers (dict): Заголовки запроса.
+        method (str): HTTP-метод запроса, по умолчанию "POST".
+
+    Returns:
+        dict: Ответ от API в виде словаря.
+    """
+    headers = {**headers, "Content-Type": "application/json"}
+    async with _LIMITER:
+        response = await client.request(
+            method, url, content=orjson.dumps(payload), headers=headers
+        )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+
+@retry(
+    retry=retry_if_exception_type((httpx.HTTPStatusError, httpx.TransportError)),
+    wait=wait_exponential(multiplier=0.5),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+async def _get_json(client, url, params, headers):
+    """Отправить GET-запрос через httpx и вернуть разобранный ответ.
+
+    Args:
+        client (httpx.AsyncClient): Клиент, через который отправляется запрос.
+        url (str): Адрес запроса.
+        params (dict): Параметры строки запроса.
+        headers (dict): Заголовки запроса.
+
+    Returns:
+        dict: Ответ от API в виде словаря.
+    """
+    async with _LIMITER:
+        response = await client.get(url, params=params, headers=headers)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
 
 def get_product_list(last_id, client_id, seller_token):
     """Получить список товаров магазина озон
@@ -28,6 +121,7 @@ def get_product_list(last_id, client_id, seller_token):
     headers = {
         "Client-Id": client_id,
         "Api-Key": seller_token,
+        "Content-Type": "application/json",
     }
     payload = {
         "filter": {
@@ -36,9 +130,11 @@ def get_product_list(last_id, client_id, seller_token):
         "last_id": last_id,
         "limit": 1000,
     }
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(
+        url, data=orjson.dumps(payload), headers=headers, timeout=(5, 30)
+    )
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object.get("result")
 
 
@@ -69,6 +165,85 @@ def get_offer_ids(client_id, seller_token):
     return offer_ids
 
 
+async def get_product_list_async(client, last_id, client_id, seller_token):
+    """Получить список товаров магазина озон через httpx-клиент.
+    Асинхронный вариант get_product_list.
+
+    Args:
+        client (httpx.AsyncClient): Клиент для отправки запроса.
+        last_id (str): Идентификатор последнего товара для начала выборки.
+        client_id (str): Идентификатор клиента для аутентификации API.
+        seller_token (str): Токен продавца для доступа к API.
+
+    Returns:
+        list: Список товаров магазина. Каждый товар представлен в виде словаря.
+    """
+
+    url = "https://api-seller.ozon.ru/v2/product/list"
+    headers = {
+        "Client-Id": client_id,
+        "Api-Key": seller_token,
+    }
+    payload = {
+        "filter": {
+            "visibility": "ALL",
+        },
+        "last_id": last_id,
+        "limit": 1000,
+    }
+    response_object = await _post_json(client, url, payload, headers)
+    return response_object.get("result")
+
+
+async def get_offer_ids_async(client_id, seller_token):
+    """Получить артикулы товаров магазина озон с предвыборкой страниц.
+    Пока обрабатывается текущая страница, отдельная задача уже запрашивает
+    следующую, так что разбор списка перекрывается с сетевым ожиданием.
+
+    Args:
+        client_id (str): Идентификатор клиента для аутентификации API.
+        seller_token (str): Токен продавца для доступа к API.
+
+    Returns:
+        list: Список артикулов товаров магазина. Каждый артикул представлен
+              в виде строки.
+    """
+
+    queue = asyncio.Queue(maxsize=2)
+
+    async def produce(client):
+        # Сентинел кладем в finally: иначе при ошибке продюсера
+        # потребитель навсегда зависнет на queue.get()
+        try:
+            last_id = ""
+            fetched = 0
+            while True:
+                some_prod = await get_product_list_async(
+                    client, last_id, client_id, seller_token
+                )
+                await queue.put(some_prod)
+                fetched += len(some_prod.get("items"))
+                last_id = some_prod.get("last_id")
+                if some_prod.get("total") == fetched:
+                    break
+        finally:
+            await queue.put(None)
+
+    product_list = []
+    async with httpx.AsyncClient(http2=True, timeout=30) as client:
+        producer = asyncio.create_task(produce(client))
+        while True:
+            some_prod = await queue.get()
+            if some_prod is None:
+                break
+            product_list.extend(some_prod.get("items"))
+        await producer
+    offer_ids = []
+    for product in product_list:
+        offer_ids.append(product.get("offer_id"))
+    return offer_ids
+
+
 def update_price(prices: list, client_id, seller_token):
     """Обновить цены товаров
     Функция отправляет обновленные цены товаров в магазин на Озон, используя указанные идентификатор клиента и токен продавца. 
@@ -87,11 +262,36 @@ def update_price(prices: list, client_id, seller_token):
     headers = {
         "Client-Id": client_id,
         "Api-Key": seller_token,
+        "Content-Type": "application/json",
     }
     payload = {"prices": prices}
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(
+        url, data=orjson.dumps(payload), headers=headers, timeout=(5, 30)
+    )
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
+
+
+async def update_price_async(client, prices: list, client_id, seller_token):
+    """Обновить цены товаров через httpx-клиент.
+    Асинхронный вариант update_price для конкурентной отправки партий цен.
+
+    Args:
+        client (httpx.AsyncClient): Клиент для отправки запроса.
+        prices (list): Список словарей с новыми ценами для товаров.
+        client_id (str): Идентификатор клиента для аутентификации API.
+        seller_token (str): Токен продавца для доступа к API.
+
+    Returns:
+        dict: Ответ от API в виде словаря.
+    """
+
+    url = "https://api-seller.ozon.ru/v1/product/import/prices"
+    headers = {
+        "Client-Id": client_id,
+        "Api-Key": seller_token,
+    }
+    return await _post_json(client, url, {"prices": prices}, headers)
 
 
 def update_stocks(stocks: list, client_id, seller_token):
@@ -111,11 +311,52 @@ def update_stocks(stocks: list, client_id, seller_token):
     headers = {
         "Client-Id": client_id,
         "Api-Key": seller_token,
+        "Content-Type": "application/json",
     }
     payload = {"stocks": stocks}
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(
+        url, data=orjson.dumps(payload), headers=headers, timeout=(5, 30)
+    )
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
+
+
+async def update_stocks_async(client, stocks: list, client_id, seller_token):
+    """Обновить остатки товаров через httpx-клиент.
+    Асинхронный вариант update_stocks для конкурентной отправки партий остатков.
+
+    Args:
+        client (httpx.AsyncClient): Клиент для отправки запроса.
+        stocks (list): Список словарей с новыми остатками для товаров.
+        client_id (str): Идентификатор клиента для аутентификации API.
+        seller_token (str): Токен продавца для доступа к API.
+
+    Returns:
+        dict: Ответ от API в виде словаря.
+    """
+
+    url = "https://api-seller.ozon.ru/v1/product/import/stocks"
+    headers = {
+        "Client-Id": client_id,
+        "Api-Key": seller_token,
+    }
+    return await _post_json(client, url, {"stocks": stocks}, headers)
+
+
+def _cell_to_str(value):
+    """Привести значение ячейки Excel к строке.
+    xlrd отдает числовые ячейки float-ами, поэтому целое значение
+    вроде 123.0 превращаем в "123", а не в "123.0".
+
+    Args:
+        value: Значение ячейки листа.
+
+    Returns:
+        str: Строковое представление значения.
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
 
 
 def download_stock():
@@ -124,23 +365,31 @@ def download_stock():
         Returns:
         list: Список словарей, содержащих информацию о остатках часов.
     """
-    # Скачать остатки с сайта
+    # Скачать остатки с сайта потоково, не загружая весь архив в память
     casio_url = "https://timeworld.ru/upload/files/ostatki.zip"
-    session = requests.Session()
-    response = session.get(casio_url)
-    response.raise_for_status()
-    with response, zipfile.ZipFile(io.BytesIO(response.content)) as archive:
-        archive.extractall(".")
-    # Создаем список остатков часов:
-    excel_file = "ostatki.xls"
-    watch_remnants = pd.read_excel(
-        io=excel_file,
-        na_values=None,
-        keep_default_na=False,
-        header=17,
-    ).to_dict(orient="records")
-    os.remove("./ostatki.xls")  # Удалить файл
-    return watch_remnants
+    buffer = tempfile.SpooledTemporaryFile(max_size=50 * 1024 * 1024)
+    with _SESSION.get(casio_url, stream=True, timeout=(5, 30)) as response:
+        response.raise_for_status()
+        shutil.copyfileobj(response.raw, buffer)
+    buffer.seek(0)
+    # Создаем список остатков часов прямо из архива, без распаковки на диск:
+    with zipfile.ZipFile(buffer) as archive, archive.open("ostatki.xls") as excel_file:
+        # Читаем только нужные колонки и сразу строками —
+        # без разбора остального листа и без вывода типов
+        watch_remnants = pd.read_excel(
+            io=excel_file,
+            na_values=None,
+            keep_default_na=False,
+            header=17,
+            engine="xlrd",
+            usecols=["Код", "Количество", "Цена"],
+            converters={
+                "Код": _cell_to_str,
+                "Количество": _cell_to_str,
+                "Цена": _cell_to_str,
+            },
+        )
+    return watch_remnants.to_dict(orient="records")
 
 
 def create_stocks(watch_remnants, offer_ids):
@@ -156,22 +405,22 @@ def create_stocks(watch_remnants, offer_ids):
         list: Список словарей с запасами, где каждый словарь содержит ключи  "offer_id" и "stock".
     """
     
-    # Уберем то, что не загружено в seller
-    stocks = []
+    # Дубликаты кодов в выгрузке схлопываем заранее: последняя строка побеждает
+    watch_by_code = {}
     for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append({"offer_id": str(watch.get("Код")), "stock": stock})
-            offer_ids.remove(str(watch.get("Код")))
-    # Добавим недостающее из загруженного:
+        watch_by_code[str(watch["Код"])] = watch
+    # Один проход по артикулам: либо остаток из выгрузки, либо ноль
+    stocks = []
     for offer_id in offer_ids:
-        stocks.append({"offer_id": offer_id, "stock": 0})
+        watch = watch_by_code.get(offer_id)
+        if watch is None:
+            stock = 0
+        else:
+            count = str(watch["Количество"])
+            stock = _COUNT_OVERRIDES.get(count)
+            if stock is None:
+                stock = int(count)
+        stocks.append({"offer_id": offer_id, "stock": stock})
     return stocks
 
 
@@ -181,22 +430,34 @@ def create_prices(watch_remnants, offer_ids):
     
     Args:
         watch_remnants (list): Список словарей, содержащих информацию о остатках часов. Каждый словарь должен содержать ключи "Код" и "Цена".
-        offer_ids (list): Список идентификаторов предложений, которые нужно проверить.
+        offer_ids (frozenset): Набор идентификаторов предложений, которые нужно проверить.
 
     Returns:
         list: Список словарей с ценами, где каждый словарь содержит ключи "auto_action_enabled", "currency_code", "offer_id", "old_price" и "price".
     """
-    prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "auto_action_enabled": "UNKNOWN",
-                "currency_code": "RUB",
-                "offer_id": str(watch.get("Код")),
-                "old_price": "0",
-                "price": price_conversion(watch.get("Цена")),
-            }
-            prices.append(price)
+    watch_frame = pd.DataFrame(watch_remnants, columns=["Код", "Цена"])
+    watch_frame["Код"] = watch_frame["Код"].astype(str)
+    # Дубликаты кодов в выгрузке схлопываем заранее: последняя строка побеждает
+    watch_frame = watch_frame.drop_duplicates(subset="Код", keep="last")
+    watch_frame = watch_frame[watch_frame["Код"].isin(offer_ids)]
+    # Векторная чистка цены вместо price_conversion() на каждой строке
+    price_values = (
+        watch_frame["Цена"]
+        .astype(str)
+        .str.split(".")
+        .str[0]
+        .str.replace(r"[^0-9]", "", regex=True)
+    )
+    prices = [
+        {
+            "auto_action_enabled": "UNKNOWN",
+            "currency_code": "RUB",
+            "offer_id": offer_id,
+            "old_price": "0",
+            "price": price,
+        }
+        for offer_id, price in zip(watch_frame["Код"], price_values)
+    ]
     return prices
 
 
@@ -212,7 +473,7 @@ def price_conversion(price: str) -> str:
         str: Строка, содержащая только числовую часть цены"5990".
     """
         
-    return re.sub("[^0-9]", "", price.split(".")[0])
+    return _PRICE_RE.sub("", price.partition(".")[0])
 
 
 def divide(lst: list, n: int):
@@ -222,32 +483,47 @@ def divide(lst: list, n: int):
         lst (list): Список, который необходимо разделить.
         n (int): Количество элементов в каждом подсписке.
         
-    Returns: 
+    Yields: 
         list: Подсписки, содержащие до n элементов из исходного списка.
+              Генератор ленивый, оборачивать его в list() не нужно.
     """
     for i in range(0, len(lst), n):
         yield lst[i : i + n]
 
 
-async def upload_prices(watch_remnants, client_id, seller_token):
+async def upload_prices(watch_remnants, client_id, seller_token, offer_ids=None):
     """ Загружает цена на часы на в магазин.
     Создает список цен на основе остатков часов и обновляет цены на платформе, отправляя партиями по 1000.
     Args:
         watch_remnants (list): Список словарей, содержащих информацию о остатках часов. Каждый словарь должен содержать ключи, необходимые для создания цен.
         client_id (str): Идентификатор клиента, используемый для аутентификации.
         seller_token (str): Токен продавца, используемый для аутентификации.
+        offer_ids (list): Уже полученный список артикулов. Если не передан,
+            список запрашивается у API заново.
 
     Returns:
         list: Список словарей с ценами, которые были загружены на платформу.
     """
-    offer_ids = get_offer_ids(client_id, seller_token)
-    prices = create_prices(watch_remnants, offer_ids)
-    for some_price in list(divide(prices, 1000)):
-        update_price(some_price, client_id, seller_token)
+    if offer_ids is None:
+        offer_ids = await get_offer_ids_async(client_id, seller_token)
+    # Неизменяемый набор для быстрых проверок принадлежности
+    offer_set = frozenset(offer_ids)
+    prices = create_prices(watch_remnants, offer_set)
+    limits = httpx.Limits(max_connections=16)
+    async with httpx.AsyncClient(http2=True, timeout=30, limits=limits) as client:
+        semaphore = asyncio.Semaphore(8)
+
+        async def send(some_price):
+            async with semaphore:
+                return await update_price_async(
+                    client, some_price, client_id, seller_token
+                )
+
+        await asyncio.gather(*(send(some_price) for some_price in divide(prices, 1000)))
     return prices
 
 
-async def upload_stocks(watch_remnants, client_id, seller_token):
+async def upload_stocks(watch_remnants, client_id, seller_token, offer_ids=None):
     """ Обновляет запасы часов в магазине.
     Создает список запасов на основе остатков и обновляет запасы в магазине, отправляя по 100.
     
@@ -255,16 +531,28 @@ async def upload_stocks(watch_remnants, client_id, seller_token):
         watch_remnants (list): Список словарей, содержащих информацию о остатках часов. Каждый словарь должен содержать ключи, необходимые для создания запасов.
         client_id (str): Идентификатор клиента, используемый для аутентификации.
         seller_token (str): Токен продавца, используемый для аутентификации.
+        offer_ids (list): Уже полученный список артикулов. Если не передан,
+            список запрашивается у API заново.
 
     Returns:
         list: Список словарей с запасами, у которых количество больше нуля.
         list: Список всех созданных запасов.
     """
-    offer_ids = get_offer_ids(client_id, seller_token)
+    if offer_ids is None:
+        offer_ids = await get_offer_ids_async(client_id, seller_token)
     stocks = create_stocks(watch_remnants, offer_ids)
-    for some_stock in list(divide(stocks, 100)):
-        update_stocks(some_stock, client_id, seller_token)
-    not_empty = list(filter(lambda stock: (stock.get("stock") != 0), stocks))
+    limits = httpx.Limits(max_connections=16)
+    async with httpx.AsyncClient(http2=True, timeout=30, limits=limits) as client:
+        semaphore = asyncio.Semaphore(8)
+
+        async def send(some_stock):
+            async with semaphore:
+                return await update_stocks_async(
+                    client, some_stock, client_id, seller_token
+                )
+
+        await asyncio.gather(*(send(some_stock) for some_stock in divide(stocks, 100)))
+    not_empty = [stock for stock in stocks if stock["stock"]]
     return not_empty, stocks
 
 
@@ -272,17 +560,23 @@ def main():
     env = Env()
     seller_token = env.str("SELLER_TOKEN")
     client_id = env.str("CLIENT_ID")
-    try:
-        offer_ids = get_offer_ids(client_id, seller_token)
-        watch_remnants = download_stock()
+
+    async def run_shop(watch_remnants):
+        # Получаем артикулы один раз и используем для остатков и цен
+        offer_ids = await get_offer_ids_async(client_id, seller_token)
         # Обновить остатки
-        stocks = create_stocks(watch_remnants, offer_ids)
-        for some_stock in list(divide(stocks, 100)):
-            update_stocks(some_stock, client_id, seller_token)
+        await upload_stocks(
+            watch_remnants, client_id, seller_token, offer_ids=offer_ids
+        )
         # Поменять цены
-        prices = create_prices(watch_remnants, offer_ids)
-        for some_price in list(divide(prices, 900)):
-            update_price(some_price, client_id, seller_token)
+        await upload_prices(
+            watch_remnants, client_id, seller_token, offer_ids=offer_ids
+        )
+
+    try:
+        watch_remnants = download_stock()
+        # Один событийный цикл на весь прогон вместо asyncio.run на каждый шаг
+        asyncio.run(run_shop(watch_remnants))
     except requests.exceptions.ReadTimeout:
         print("Превышено время ожидания...")
     except requests.exceptions.ConnectionError as error: